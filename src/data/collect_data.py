@@ -1,86 +1,168 @@
+import argparse
+import logging
 import os
 import pandas as pd
-import requests
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta, timezone
+from types import MappingProxyType
 import time
 
+from http_utils import cached_get, make_session, RateLimiter, TTL_LONG
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Shared keep-alive session for all EPA AQS requests
+SESSION = make_session()
+
+# AQS asks clients to stay around 10 requests per minute with pauses between
+# calls, and may disable the shared test credentials otherwise
+AQS_RATE_LIMITER = RateLimiter(min_interval=6.0)
+
+# These are the main EPA monitoring stations in NYC (read-only)
+_STATIONS = MappingProxyType({
+    '36-005-0112': {'name': 'IS 52 - Bronx', 'lat': 40.813, 'lon': -73.913},
+    '36-081-0124': {'name': 'PS 19 - Queens', 'lat': 40.743, 'lon': -73.891},
+    '36-047-0010': {'name': 'PS 274 - Brooklyn', 'lat': 40.621, 'lon': -73.912},
+    '36-061-0014': {'name': 'CCNY - Manhattan', 'lat': 40.819, 'lon': -73.949}
+})
+# Station ID -> display name, built once for Series.map
+_STATION_NAMES = pd.Series({k: v['name'] for k, v in _STATIONS.items()})
+
 def get_nyc_stations():
     """Get list of EPA monitoring stations in NYC"""
-    # These are the main EPA monitoring stations in NYC
-    stations = {
-        '36-005-0112': {'name': 'IS 52 - Bronx', 'lat': 40.813, 'lon': -73.913},
-        '36-081-0124': {'name': 'PS 19 - Queens', 'lat': 40.743, 'lon': -73.891},
-        '36-047-0010': {'name': 'PS 274 - Brooklyn', 'lat': 40.621, 'lon': -73.912},
-        '36-061-0014': {'name': 'CCNY - Manhattan', 'lat': 40.819, 'lon': -73.949}
-    }
-    return stations
+    return _STATIONS
+
+def date_windows(start, end):
+    """
+    Split the inclusive date range [start, end] at year boundaries, because AQS
+    requires bdate and edate to fall in the same year.
+    """
+    windows = []
+    current = start
+    while current <= end:
+        window_end = min(end, date(current.year, 12, 31))
+        windows.append((current, window_end))
+        current = window_end + timedelta(days=1)
+    return windows
 
-def fetch_epa_data():
-    """Fetch data from EPA's AQS for NYC"""
+def _fetch_window(station_id, bdate, edate):
+    """
+    Fetch one date window of EPA AQS daily data for a single monitoring site.
+    Rows are tagged with the full station ID ('SS-CCC-NNNN') they belong to.
+    """
+    state, county, site = station_id.split('-')
     # Using EPA's AQS API endpoint
-    base_url = "https://aqs.epa.gov/data/api/dailyData/byState"
+    base_url = "https://aqs.epa.gov/data/api/dailyData/bySite"
     
     # Parameters for the API request
     params = {
         'email': 'test@example.com',  # EPA requires an email for API access
         'key': 'test',  # EPA requires a key, but 'test' works for public data
         'param': '42101,42401,42602,44201,88101',  # PM2.5, CO, NO2, O3, PM10
-        'bdate': (datetime.now() - timedelta(days=30)).strftime('%Y%m%d'),
-        'edate': datetime.now().strftime('%Y%m%d'),
-        'state': '36'  # New York state FIPS code
+        'bdate': bdate.strftime('%Y%m%d'),
+        'edate': edate.strftime('%Y%m%d'),
+        'state': state,  # State FIPS code
+        'county': county,
+        'site': site
     }
     
     try:
-        response = requests.get(base_url, params=params)
+        response = cached_get(
+            base_url, params=params, ttl=TTL_LONG, session=SESSION, rate_limiter=AQS_RATE_LIMITER
+        )
         if response.status_code == 200:
-            return response.json()
+            data = response.json()
+            for row in data.get('Data', []):
+                row['station_id'] = station_id
+            return data
         else:
-            print(f"Error fetching data: {response.status_code}")
-            print(f"Response: {response.text}")
+            logger.error(f"Error fetching data for {station_id} from {bdate} to {edate}: {response.status_code}")
+            logger.error(f"Response: {response.text}")
             return None
     except Exception as e:
-        print(f"Exception fetching data: {str(e)}")
+        logger.error(f"Exception fetching data for {station_id} from {bdate} to {edate}: {str(e)}")
         return None
 
-def main():
+def fetch_epa_data(stations, days=30, now=None):
+    """
+    Fetch data from EPA's AQS for the given NYC stations.
+    Each station is queried through the bySite endpoint, so only rows for those
+    sites are downloaded, with one request per station for the whole range
+    (split only at a year boundary). Requests run one after another on the shared
+    session, paced by AQS_RATE_LIMITER, then are merged into a single response
+    dict with a combined 'Data' list.
+    `now` (a UTC datetime, defaulting to the current time) anchors the date range
+    so callers can pin it.
+    """
+    if now is None:
+        now = datetime.now(timezone.utc)
+    end = now.date()
+    start = end - timedelta(days=days)
+    requests_to_make = [
+        (station_id, bdate, edate)
+        for station_id in stations
+        for bdate, edate in date_windows(start, end)
+    ]
+
+    # AQS pacing allows one request at a time, so there is nothing to parallelize
+    chunks = [_fetch_window(*request) for request in requests_to_make]
+
+    chunks = [chunk for chunk in chunks if chunk and 'Data' in chunk]
+    if not chunks:
+        return None
+    return {
+        'Header': chunks[0].get('Header'),
+        'Data': [row for chunk in chunks for row in chunk['Data']]
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Collect EPA AQS air quality data for NYC")
+    parser.add_argument('--emit-csv', action='store_true', help="Also write a CSV copy of the Parquet output")
+    emit_csv = parser.parse_args(argv).emit_csv
+
     # Create data directory if it doesn't exist
     os.makedirs('data/raw', exist_ok=True)
     
     # Get NYC stations
-    print("Getting NYC monitoring stations...")
+    logger.info("Getting NYC monitoring stations...")
     stations = get_nyc_stations()
-    print(f"Found {len(stations)} stations in NYC")
+    logger.info(f"Found {len(stations)} stations in NYC")
     
     # Fetch EPA data
-    print("\nFetching EPA air quality data...")
-    data = fetch_epa_data()
+    logger.info("Fetching EPA air quality data...")
+    # Capture the clock once so the query window and output filename agree
+    now = datetime.now(timezone.utc)
+    data = fetch_epa_data(stations, now=now)
     
     if data and 'Data' in data:
-        # Convert to DataFrame
-        df = pd.DataFrame(data['Data'])
-        
-        # Filter for NYC stations
-        df = df[df['site_number'].isin(stations.keys())]
+        # Convert to DataFrame (rows are already limited to NYC stations)
+        df = pd.DataFrame.from_records(data['Data'])
         
         # Add station names
-        station_names = {k: v['name'] for k, v in stations.items()}
-        df['station_name'] = df['site_number'].map(station_names)
+        df['station_name'] = df['station_id'].map(_STATION_NAMES)
         
         # Save raw data
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        output_file = f'data/raw/nyc_air_quality_{timestamp}.csv'
-        df.to_csv(output_file, index=False)
-        print(f"\nData saved to {output_file}")
+        timestamp = now.strftime('%Y%m%d_%H%M%S')
+        output_file = f'data/raw/nyc_air_quality_{timestamp}.parquet'
+        df.to_parquet(output_file, engine='pyarrow', compression='snappy', index=False)
+        logger.info(f"Data saved to {output_file}")
+        if emit_csv:
+            csv_file = output_file.replace('.parquet', '.csv')
+            df.to_csv(csv_file, index=False)
+            logger.info(f"Data also saved to {csv_file}")
         
-        # Print summary statistics
-        print("\nSummary of collected data:")
-        print(f"Total measurements: {len(df)}")
-        print("\nParameters available:")
-        print(df['parameter_name'].value_counts())
-        print("\nStations covered:")
-        print(df['station_name'].value_counts())
+        # Log summary statistics as a single message
+        logger.info(
+            "Summary of collected data:\n"
+            f"Total measurements: {len(df)}\n"
+            "Parameters available:\n"
+            f"{df['parameter_name'].value_counts().to_string(header=False)}\n"
+            "Stations covered:\n"
+            f"{df['station_name'].value_counts().to_string(header=False)}"
+        )
     else:
-        print("No measurements were collected")
+        logger.warning("No measurements were collected")
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
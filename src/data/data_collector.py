@@ -1,22 +1,91 @@
-import requests
+import aiohttp
+import argparse
+import asyncio
+from cachetools import TTLCache
+import math
+import orjson
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
 from datetime import datetime, timedelta
 import os
 from dotenv import load_dotenv
 import logging
-import time
+
+from http_utils import (
+    MAX_ATTEMPTS, RETRY_STATUSES, ResponseCache, TTL_NORMAL, TTL_SHORT, backoff_delay, serves_stale
+)
+
+try:
+    import rusty_req  # Optional Rust (reqwest/tokio) batch HTTP client
+except ImportError:
+    rusty_req = None
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# OpenAQ v3 returns at most this many results per page
+PAGE_LIMIT = 100
+# Upper bound on in-flight requests to stay polite to the API
+MAX_CONCURRENT_REQUESTS = 8
+# Measurement fields kept from each OpenAQ result
+MEASUREMENT_FIELDS = ('date', 'value', 'unit', 'location', 'city', 'country')
+# Arrow schema for raw measurements written by the streaming path
+MEASUREMENT_SCHEMA = pa.schema([
+    ('date', pa.string()),
+    ('value', pa.float32()),
+    ('unit', pa.string()),
+    ('location', pa.string()),
+    ('city', pa.string()),
+    ('country', pa.string()),
+    ('parameter', pa.string())
+])
+# Timeouts (seconds) for the optional native batch client
+NATIVE_REQUEST_TIMEOUT = 30.0
+NATIVE_BATCH_TIMEOUT = 120.0
+# Low-cardinality string columns stored as pandas categoricals
+STRING_CATEGORY_COLUMNS = ('location', 'city', 'country', 'unit')
+
+# Errors that mean a single request failed: network/HTTP errors, timeouts and
+# bodies that are not valid JSON
+FETCH_ERRORS = (aiohttp.ClientError, asyncio.TimeoutError, orjson.JSONDecodeError)
+
+def _native_body(response):
+    """
+    Body text of a rusty_req result. The 'response' field arrives as a JSON string
+    wrapping {'content': ..., 'headers': ...}.
+    """
+    payload = response['response']
+    if isinstance(payload, str):
+        payload = orjson.loads(payload)
+    content = payload['content']
+    return content if isinstance(content, str) else orjson.dumps(content).decode('utf-8')
+
+class MissingAPIKeyError(ValueError):
+    """Raised when OPENAQ_API_KEY is not configured."""
+
+def _min_page_count(found):
+    """Number of pages implied by a lower-bound meta.found such as ">1000", or 0 if unparseable."""
+    try:
+        return math.ceil(int(str(found).lstrip('>')) / PAGE_LIMIT)
+    except ValueError:
+        return 0
+
 class AirQualityDataCollector:
-    def __init__(self):
+    """
+    Async OpenAQ v3 client. Use as an async context manager so the
+    underlying HTTP session is opened and closed on the running event loop:
+
+        async with AirQualityDataCollector() as collector:
+            locations = await collector.get_locations('Chicago')
+    """
+    def __init__(self, max_concurrency=MAX_CONCURRENT_REQUESTS, use_native_http=None):
         load_dotenv()
         self.base_url = "https://api.openaq.org/v3"
         self.api_key = os.getenv('OPENAQ_API_KEY')
         if not self.api_key:
-            raise ValueError("OpenAQ API key not found. Please set OPENAQ_API_KEY in .env file")
+            raise MissingAPIKeyError("OpenAQ API key not found. Please set OPENAQ_API_KEY in .env file")
         
         # Log first few characters of API key for debugging (safely)
         logger.info(f"Using API key starting with: {self.api_key[:8]}...")
@@ -26,12 +95,82 @@ class AirQualityDataCollector:
             'User-Agent': 'AirQualityDataCollector/1.0',
             'X-API-Key': self.api_key  # Correct header for OpenAQ v3
         }
+        self.cache = ResponseCache()
+        self._locations_cache = TTLCache(maxsize=128, ttl=TTL_NORMAL)
+        self.session = None
+        self.max_concurrency = max_concurrency
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._native_lock = asyncio.Lock()
+
+        # Page fan-out can go through rusty_req when OPENAQ_NATIVE_HTTP=1 (or use_native_http=True)
+        if use_native_http is None:
+            use_native_http = os.getenv('OPENAQ_NATIVE_HTTP') == '1'
+        if use_native_http and rusty_req is None:
+            logger.warning("Native HTTP client requested but rusty_req is not installed; using aiohttp")
+            use_native_http = False
+        self.use_native_http = use_native_http
 
-    def get_locations(self, city, country="US", limit=10):
+    async def __aenter__(self):
+        self.session = aiohttp.ClientSession(
+            headers=self.headers,
+            connector=aiohttp.TCPConnector(limit=20)
+        )
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.session.close()
+        self.session = None
+
+    async def _cached_get(self, url, params, ttl):
+        """
+        GET a URL through the on-disk response cache and return the decoded JSON body.
+        Fresh cache entries skip the network entirely; on connection errors, undecodable
+        bodies, or 429/5xx responses that outlast the retries, the last cached entry is
+        served if one exists.
+        """
+        entry = self.cache.get(url, params)
+        if self.cache.is_fresh(entry):
+            return orjson.loads(entry['body'])
+        try:
+            status, body = await self._get_with_backoff(url, params)
+            # Decode before caching so a non-JSON 200 (e.g. a maintenance page) is never stored
+            data = orjson.loads(body)
+        except FETCH_ERRORS as e:
+            client_error = isinstance(e, aiohttp.ClientResponseError) and not serves_stale(e.status)
+            if entry is not None and not client_error:
+                logger.warning(f"Serving stale cached response for {url}: {str(e)}")
+                return orjson.loads(entry['body'])
+            raise
+        self.cache.put(url, params, status, body, ttl)
+        return data
+
+    async def _get_with_backoff(self, url, params):
+        """
+        GET a URL, retrying 429 and 5xx responses with exponential backoff and jitter.
+        The semaphore is released while sleeping so other requests can proceed.
+        Returns (status, body text).
+        """
+        for attempt in range(MAX_ATTEMPTS):
+            async with self._semaphore:
+                async with self.session.get(url, params=params) as response:
+                    if response.status not in RETRY_STATUSES or attempt == MAX_ATTEMPTS - 1:
+                        response.raise_for_status()
+                        return response.status, await response.text()
+                    retry_after = response.headers.get('Retry-After')
+            delay = backoff_delay(attempt, retry_after)
+            logger.warning(f"Got {response.status} from {url}, retrying in {delay:.1f}s (attempt {attempt + 1}/{MAX_ATTEMPTS})")
+            await asyncio.sleep(delay)
+
+    async def get_locations(self, city, country="US", limit=10):
         """
         List available locations for a city and country using OpenAQ v3 API.
+        Successful lookups are memoized in-process for an hour per (city, country, limit).
         Returns a list of location dicts.
         """
+        key = (city, country, limit)
+        if key in self._locations_cache:
+            return list(self._locations_cache[key])
+
         url = f"{self.base_url}/locations"
         params = {
             'city': city,
@@ -42,142 +181,369 @@ class AirQualityDataCollector:
             # Log the request details for debugging
             logger.info(f"Making request to: {url}")
             logger.info(f"With params: {params}")
-            logger.info(f"Using headers: {self.headers}")
             
-            response = requests.get(url, params=params, headers=self.headers)
-            
-            # Log response details for debugging
-            logger.info(f"Response status code: {response.status_code}")
-            logger.info(f"Response headers: {dict(response.headers)}")
-            
-            response.raise_for_status()
-            data = response.json()
+            data = await self._cached_get(url, params, TTL_NORMAL)
             locations = data.get('results', [])
             if not locations:
                 logger.warning(f"No locations found for {city}, {country}")
             else:
                 logger.info(f"Found {len(locations)} locations for {city}, {country}")
-            return locations
-        except requests.exceptions.RequestException as e:
+                self._locations_cache[key] = locations
+            return list(locations)
+        except FETCH_ERRORS as e:
             logger.error(f"Error fetching locations for {city}, {country}: {str(e)}")
-            if hasattr(e.response, 'text'):
-                logger.error(f"Response text: {e.response.text}")
             return []
 
-    def fetch_air_quality_data(self, location_id, start_date, end_date, parameters=None, max_pages=10):
+    async def fetch_air_quality_data(self, location_id, start_date, end_date, parameters=None, max_pages=10,
+                                     stream=False, output_path=None):
         """
         Fetch air quality data from OpenAQ API v3 for a specific location_id and date range.
+        All parameters are fetched concurrently.
         Args:
             location_id (int): OpenAQ location ID
             start_date (str): Start date in YYYY-MM-DD format
             end_date (str): End date in YYYY-MM-DD format
             parameters (list): List of parameters to fetch (e.g., ['pm25', 'pm10', 'o3'])
             max_pages (int): Maximum number of pages to fetch per parameter
+            stream (bool): Write raw measurements to output_path page by page instead of
+                building a DataFrame in memory. The file uses a different layout from the
+                returned DataFrame: one row per measurement (long format, MEASUREMENT_SCHEMA)
+                with date as the raw UTC ISO string, not pivoted by parameter. If no rows
+                are fetched, no file is written and 0 is returned.
+            output_path (str): Parquet file to write when stream is True
         Returns:
-            pd.DataFrame: DataFrame containing the air quality data
+            pd.DataFrame: DataFrame containing the air quality data, or when streaming
+            int: number of measurement rows written to output_path
         """
         if parameters is None:
             parameters = ['pm25', 'pm10', 'o3', 'no2', 'so2', 'co']
 
-        all_data = []
-        for parameter in parameters:
-            page = 1
+        if stream:
+            if output_path is None:
+                raise ValueError("output_path is required when stream=True")
+            return await self._stream_to_parquet(location_id, start_date, end_date, parameters, max_pages, output_path)
+
+        pages_per_parameter = await asyncio.gather(*(
+            self._fetch_parameter_pages(location_id, parameter, start_date, end_date, max_pages)
+            for parameter in parameters
+        ))
+
+        all_rows = []
+        for parameter, pages in zip(parameters, pages_per_parameter):
             total_results = 0
-            while page <= max_pages:
-                try:
-                    url = f"{self.base_url}/measurements"
-                    params = {
-                        'location_id': location_id,
-                        'parameter': parameter,
-                        'date_from': start_date,
-                        'date_to': end_date,
-                        'limit': 100,
-                        'page': page
-                    }
-                    response = requests.get(url, params=params, headers=self.headers)
-                    response.raise_for_status()
-                    data = response.json()
-                    results = data.get('results', [])
-                    if not results:
-                        break
-                    df = pd.DataFrame(results)
-                    if not df.empty:
-                        df['parameter'] = parameter  # Ensure parameter column exists
-                        all_data.append(df)
-                        total_results += len(df)
-                        logger.info(f"Fetched {len(df)} records for {parameter} in location {location_id} (page {page})")
-                    if len(results) < 100:
-                        break  # Last page
-                    page += 1
-                    time.sleep(0.2)  # Be nice to the API
-                except requests.exceptions.RequestException as e:
-                    logger.error(f"Error fetching {parameter} data for location {location_id} on page {page}: {str(e)}")
-                    if hasattr(e.response, 'text'):
-                        logger.error(f"Response text: {e.response.text}")
-                    break
+            for page, data in pages:
+                results = data.get('results', [])
+                all_rows.extend(self._to_records(results, parameter))
+                total_results += len(results)
+                if results:
+                    logger.info(f"Fetched {len(results)} records for {parameter} in location {location_id} (page {page})")
             if total_results == 0:
                 logger.warning(f"No data found for {parameter} in location {location_id}")
 
-        if not all_data:
+        if not all_rows:
             return pd.DataFrame()
 
-        combined_df = pd.concat(all_data, ignore_index=True)
+        # Build a single DataFrame from all pages rather than concatenating per-page frames,
+        # flattening nested objects like date {'utc', 'local'} into date_utc/date_local columns
+        combined_df = pd.json_normalize(all_rows, sep='_')
         processed_df = self._process_data(combined_df)
         return processed_df
 
+    async def _stream_to_parquet(self, location_id, start_date, end_date, parameters, max_pages, output_path):
+        """
+        Write raw long-format measurements to a Snappy Parquet file one page at a time.
+        Parameters are fetched one after another (pages within a parameter still run
+        concurrently) so only a single parameter's pages are resident at once.
+        Returns the number of rows written.
+        """
+        writer = None
+        total_rows = 0
+        try:
+            for parameter in parameters:
+                pages = await self._fetch_parameter_pages(location_id, parameter, start_date, end_date, max_pages)
+                parameter_rows = 0
+                for page, data in pages:
+                    records = self._to_records(data.get('results', []), parameter)
+                    if not records:
+                        continue
+                    for record in records:
+                        date = record['date']
+                        record['date'] = date.get('utc') if isinstance(date, dict) else date
+                    if writer is None:
+                        writer = pq.ParquetWriter(output_path, MEASUREMENT_SCHEMA, compression='snappy')
+                    writer.write_table(pa.Table.from_pylist(records, schema=MEASUREMENT_SCHEMA))
+                    parameter_rows += len(records)
+                    logger.info(f"Wrote {len(records)} records for {parameter} in location {location_id} (page {page})")
+                if parameter_rows == 0:
+                    logger.warning(f"No data found for {parameter} in location {location_id}")
+                total_rows += parameter_rows
+        finally:
+            if writer is not None:
+                writer.close()
+        return total_rows
+
+    @staticmethod
+    def _to_records(results, parameter):
+        """Project OpenAQ results to MEASUREMENT_FIELDS and tag each with its parameter."""
+        records = []
+        for row in results:
+            # Keep only the fields _process_data uses so unused columns are never materialized
+            record = {field: row.get(field) for field in MEASUREMENT_FIELDS}
+            record['parameter'] = parameter  # Ensure parameter column exists
+            records.append(record)
+        return records
+
+    async def _fetch_parameter_pages(self, location_id, parameter, start_date, end_date, max_pages):
+        """
+        Fetch every page of measurements for one parameter. Page 1 is fetched
+        first to learn meta.found; the remaining pages are then requested concurrently,
+        in batches when the API only reports a lower bound.
+        Returns a list of (page, response_json) tuples in page order.
+        """
+        url = f"{self.base_url}/measurements"
+        params = {
+            'location_id': location_id,
+            'parameter': parameter,
+            'date_from': start_date,
+            'date_to': end_date,
+            'limit': PAGE_LIMIT
+        }
+        try:
+            first = await self._cached_get(url, {**params, 'page': 1}, TTL_SHORT)
+        except FETCH_ERRORS as e:
+            logger.error(f"Error fetching {parameter} data for location {location_id} on page 1: {str(e)}")
+            return []
+
+        pages = [(1, first)]
+        found = first.get('meta', {}).get('found')
+        if isinstance(found, int):
+            npages = min(max_pages, math.ceil(found / PAGE_LIMIT))
+            pages += await self._fetch_pages(url, params, range(2, npages + 1), location_id, parameter)
+        elif len(first.get('results', [])) >= PAGE_LIMIT:
+            # meta.found is only a lower bound (e.g. ">1000"): fetch the pages it implies
+            # at once, then keep dispatching batches of pages until one comes back short
+            next_page = 2
+            batch_end = min(max_pages, max(_min_page_count(found), next_page + self.max_concurrency - 1))
+            while next_page <= max_pages:
+                batch = await self._fetch_pages(url, params, range(next_page, batch_end + 1), location_id, parameter)
+                pages += batch
+                if not batch or any(len(data.get('results', [])) < PAGE_LIMIT for _, data in batch):
+                    break
+                next_page = batch_end + 1
+                batch_end = min(max_pages, next_page + self.max_concurrency - 1)
+        return pages
+
+    async def _fetch_pages(self, url, params, page_numbers, location_id, parameter):
+        """
+        Fetch the given measurement pages concurrently. Failed pages are logged and skipped.
+        Returns a list of (page, response_json) tuples in page order.
+        """
+        page_numbers = list(page_numbers)
+        if self.use_native_http:
+            return await self._fetch_pages_native(url, params, page_numbers, location_id, parameter)
+        return await self._gather_pages(url, params, page_numbers, location_id, parameter)
+
+    async def _gather_pages(self, url, params, page_numbers, location_id, parameter):
+        """Fetch pages through _cached_get on the aiohttp session."""
+        responses = await asyncio.gather(
+            *(self._cached_get(url, {**params, 'page': page}, TTL_SHORT) for page in page_numbers),
+            return_exceptions=True
+        )
+        pages = []
+        for page, data in zip(page_numbers, responses):
+            if isinstance(data, BaseException):
+                logger.error(f"Error fetching {parameter} data for location {location_id} on page {page}: {str(data)}")
+                continue
+            pages.append((page, data))
+        return pages
+
+    async def _fetch_pages_native(self, url, params, page_numbers, location_id, parameter):
+        """
+        Fetch measurement pages through rusty_req, which performs the requests,
+        decompression and pooling in native code, in batches of max_concurrency.
+        Pages still fresh in the disk cache are served from it, and fetched pages are
+        written back to it. Pages that fail natively (error status, exception, unreadable
+        body or a failed batch) are fetched through the aiohttp path instead.
+        Returns a list of (page, response_json) tuples in page order.
+        """
+        pages = {}
+        pending = []
+        for page in page_numbers:
+            entry = self.cache.get(url, {**params, 'page': page})
+            if self.cache.is_fresh(entry):
+                pages[page] = orjson.loads(entry['body'])
+            else:
+                pending.append(page)
+
+        # Pages the native client could not deliver are re-sent through _cached_get, which
+        # adds 429/5xx backoff, the shared semaphore and the stale-cache fallback
+        fallback = []
+        for start in range(0, len(pending), self.max_concurrency):
+            batch = pending[start:start + self.max_concurrency]
+            try:
+                responses = await self._native_batch(url, params, batch)
+            except Exception as e:
+                logger.warning(f"Native batch failed for {parameter} in location {location_id}, using aiohttp: {str(e)}")
+                fallback += batch
+                continue
+
+            delivered = set()
+            for response in responses:
+                try:
+                    page = int(response['meta']['tag'])
+                except (KeyError, TypeError, ValueError):
+                    continue  # untagged results count as undelivered below
+                delivered.add(page)
+                if response.get('exception') or response.get('http_status') != 200:
+                    error = response.get('exception') or response.get('http_status')
+                    logger.warning(f"Native fetch of {parameter} page {page} for location {location_id} failed ({error}), retrying via aiohttp")
+                    fallback.append(page)
+                    continue
+                try:
+                    body = _native_body(response)
+                    data = orjson.loads(body)
+                except (KeyError, TypeError, ValueError) as e:
+                    logger.warning(f"Unreadable native response for {parameter} page {page}, retrying via aiohttp: {str(e)}")
+                    fallback.append(page)
+                    continue
+                self.cache.put(url, {**params, 'page': page}, 200, body, TTL_SHORT)
+                pages[page] = data
+            fallback += [page for page in batch if page not in delivered]
+
+        if fallback:
+            pages.update(await self._gather_pages(url, params, fallback, location_id, parameter))
+        return sorted(pages.items())
+
+    async def _native_batch(self, url, params, batch):
+        """
+        Send one batch of pages through rusty_req. Batches run one at a time and hold one
+        semaphore slot per request, so the native client shares the aiohttp in-flight cap.
+        """
+        request_items = [
+            rusty_req.RequestItem(
+                url=url,
+                method='GET',
+                params={key: str(value) for key, value in {**params, 'page': page}.items()},
+                headers=self.headers,
+                tag=str(page),
+                timeout=NATIVE_REQUEST_TIMEOUT
+            )
+            for page in batch
+        ]
+        async with self._native_lock:
+            # Only the lock holder takes several slots, so this cannot deadlock with
+            # single-slot aiohttp requests
+            for _ in batch:
+                await self._semaphore.acquire()
+            try:
+                return await rusty_req.fetch_requests(
+                    request_items,
+                    total_timeout=NATIVE_BATCH_TIMEOUT,
+                    mode=rusty_req.ConcurrencyMode.SELECT_ALL
+                )
+            finally:
+                for _ in batch:
+                    self._semaphore.release()
+
     def _process_data(self, df):
         if df.empty:
             return df
-        # Extract relevant columns for v3
-        processed_df = df[['date', 'parameter', 'value', 'unit', 'location', 'city', 'country']].copy()
+        # Extract relevant columns for v3; dates arrive already flattened to date_utc
+        date_column = 'date_utc' if 'date_utc' in df.columns else 'date'
+        processed_df = df[[date_column, 'parameter', 'value', 'unit', 'location', 'city', 'country']].rename(
+            columns={date_column: 'date'}
+        )
         # Convert date to datetime
-        processed_df['date'] = pd.to_datetime(processed_df['date'].apply(lambda x: x['utc'] if isinstance(x, dict) and 'utc' in x else x))
-        # Pivot the data to have parameters as columns
-        processed_df = processed_df.pivot_table(
-            index=['date', 'location', 'city', 'country'],
-            columns='parameter',
-            values='value',
-            aggfunc='mean'
-        ).reset_index()
+        processed_df['date'] = pd.to_datetime(processed_df['date'], utc=True, format='ISO8601')
+        # Declare compact dtypes up front: low-cardinality strings as categories, values as float32
+        processed_df['value'] = processed_df['value'].astype('float32')
+        for column in STRING_CATEGORY_COLUMNS:
+            processed_df[column] = processed_df[column].astype('category')
+        # Pivot the data to have parameters as columns. A plain reshape is enough unless
+        # the same (date, location, parameter) was reported more than once, in which case
+        # readings are averaged. Both branches keep rows with a null key (e.g. no city).
+        index = ['date', 'location', 'city', 'country']
+        if processed_df.duplicated(index + ['parameter']).any():
+            processed_df = (
+                processed_df
+                # observed=True: only combinations present in the data, not the categorical cross product
+                .groupby(index + ['parameter'], observed=True, dropna=False)['value']
+                .mean()
+                .unstack('parameter')
+            )
+        else:
+            processed_df = processed_df.pivot(index=index, columns='parameter', values='value')
+        processed_df = processed_df.reset_index()
         return processed_df
 
-def main():
+async def fetch_and_save(collector, city, loc, start_date_str, end_date_str, emit_csv=False):
+    """Fetch one location and write its file as soon as it is ready."""
+    location_name = loc['name']
+    logger.info(f"Fetching data for {city} - {location_name} (ID: {loc['id']})")
+    df = await collector.fetch_air_quality_data(
+        location_id=loc['id'],
+        start_date=start_date_str,
+        end_date=end_date_str
+    )
+    if not df.empty:
+        output_dir = 'data/raw'
+        os.makedirs(output_dir, exist_ok=True)
+        filename = f"{output_dir}/{city.lower().replace(' ', '_')}_{location_name.lower().replace(' ', '_')}_air_quality.parquet"
+        df.to_parquet(filename, engine='pyarrow', compression='snappy', index=False)
+        logger.info(f"Saved data for {city} - {location_name} to {filename}")
+        if emit_csv:
+            df.to_csv(filename.replace('.parquet', '.csv'), index=False)
+    else:
+        logger.warning(f"No data collected for {city} - {location_name}")
+
+async def run_all(cities, country, start_date_str, end_date_str, emit_csv=False):
+    """
+    Look up locations for every city, then fetch all locations concurrently.
+    Each location is saved as it finishes; a failure in one location is logged
+    and does not affect the others.
+    """
+    async with AirQualityDataCollector() as collector:
+        for city in cities:
+            logger.info(f"Looking up locations for {city}, {country}")
+        lookups = await asyncio.gather(*(
+            collector.get_locations(city, country=country, limit=3) for city in cities
+        ))
+
+        jobs = []
+        for city, locations in zip(cities, lookups):
+            if not locations:
+                logger.warning(f"No locations found for {city}, skipping.")
+                continue
+            for loc in locations:
+                jobs.append((city, loc))
+
+        results = await asyncio.gather(
+            *(fetch_and_save(collector, city, loc, start_date_str, end_date_str, emit_csv=emit_csv)
+              for city, loc in jobs),
+            return_exceptions=True
+        )
+
+    for (city, loc), result in zip(jobs, results):
+        if isinstance(result, Exception):
+            logger.error(f"Failed to collect data for {city} - {loc['name']}: {str(result)}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Collect OpenAQ air quality data for US cities")
+    parser.add_argument('--emit-csv', action='store_true', help="Also write a CSV copy of each Parquet output")
+    args = parser.parse_args(argv)
     try:
-        collector = AirQualityDataCollector()
         end_date = datetime.now()
         start_date = end_date - timedelta(days=30)
         start_date_str = start_date.strftime('%Y-%m-%d')
         end_date_str = end_date.strftime('%Y-%m-%d')
         cities = ['Los Angeles', 'New York', 'Chicago']
         country = 'US'
-        for city in cities:
-            logger.info(f"Looking up locations for {city}, {country}")
-            locations = collector.get_locations(city, country=country, limit=3)
-            if not locations:
-                logger.warning(f"No locations found for {city}, skipping.")
-                continue
-            for loc in locations:
-                location_id = loc['id']
-                location_name = loc['name']
-                logger.info(f"Fetching data for {city} - {location_name} (ID: {location_id})")
-                df = collector.fetch_air_quality_data(
-                    location_id=location_id,
-                    start_date=start_date_str,
-                    end_date=end_date_str
-                )
-                if not df.empty:
-                    output_dir = 'data/raw'
-                    os.makedirs(output_dir, exist_ok=True)
-                    filename = f"{output_dir}/{city.lower().replace(' ', '_')}_{location_name.lower().replace(' ', '_')}_air_quality.csv"
-                    df.to_csv(filename, index=False)
-                    logger.info(f"Saved data for {city} - {location_name} to {filename}")
-                else:
-                    logger.warning(f"No data collected for {city} - {location_name}")
-    except ValueError as e:
+        asyncio.run(run_all(cities, country, start_date_str, end_date_str, emit_csv=args.emit_csv))
+    except MissingAPIKeyError as e:
         logger.error(str(e))
         logger.error("Please set your OpenAQ API key in the .env file")
     except Exception as e:
         logger.error(f"An unexpected error occurred: {str(e)}")
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    main() 
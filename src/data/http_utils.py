@@ -0,0 +1,189 @@
+import hashlib
+import os
+import random
+import threading
+import time
+from urllib.parse import urlencode
+
+import orjson
+import requests
+from requests.adapters import HTTPAdapter
+
+# Freshness tiers (seconds) for cached API responses
+TTL_SHORT = 600          # measurements
+TTL_NORMAL = 3600        # location metadata
+TTL_LONG = 6 * 3600      # EPA daily summaries
+
+DEFAULT_CACHE_DIR = 'data/.http_cache'
+
+# Responses worth retrying with exponential backoff
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+MAX_ATTEMPTS = 6
+
+
+class CachedResponse:
+    """Minimal response object returned by cached_get, whether from the network or the cache."""
+    def __init__(self, status_code, text, from_cache=False, data=None):
+        self.status_code = status_code
+        self.text = text
+        self.from_cache = from_cache
+        self._data = data  # already-decoded body, when cached_get had to decode it
+
+    def json(self):
+        if self._data is not None:
+            return self._data
+        return orjson.loads(self.text)
+
+
+class ResponseCache:
+    """
+    On-disk cache of GET responses keyed by (url, sorted params).
+    Each entry is a JSON file holding the body, status, fetch time and the
+    time after which the entry is stale. Stale entries are kept so they can
+    be served when the upstream API is unavailable.
+    """
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR):
+        self.cache_dir = cache_dir
+
+    def _path(self, url, params):
+        query = urlencode(sorted((params or {}).items()))
+        key = hashlib.sha1(f"{url}?{query}".encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def get(self, url, params):
+        """Return the cached entry for (url, params), fresh or stale, or None."""
+        try:
+            with open(self._path(url, params), 'rb') as f:
+                return orjson.loads(f.read())
+        except (OSError, orjson.JSONDecodeError):
+            return None
+
+    def put(self, url, params, status, body, ttl):
+        """Store a response body and return the new entry."""
+        now = time.time()
+        entry = {
+            'status': status,
+            'body': body,
+            'fetched_at': now,
+            'stale_at': now + ttl
+        }
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = self._path(url, params)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(orjson.dumps(entry))
+        os.replace(tmp_path, path)
+        return entry
+
+    @staticmethod
+    def is_fresh(entry):
+        return entry is not None and time.time() < entry['stale_at']
+
+
+def backoff_delay(attempt, retry_after=None, base=0.5, cap=30.0, jitter=0.5):
+    """
+    Seconds to wait before retrying after the given 0-based attempt:
+    base * 2^attempt plus random jitter, capped at `cap`. A numeric
+    Retry-After header value takes precedence when present.
+    """
+    if retry_after is not None:
+        try:
+            return min(cap, float(retry_after))
+        except ValueError:
+            pass  # HTTP-date form; fall back to exponential backoff
+    return min(cap, base * 2 ** attempt) + random.uniform(0, jitter)
+
+
+def serves_stale(status):
+    """Whether a failed response with this status should fall back to a stale cache entry."""
+    return status == 429 or status >= 500
+
+
+class RateLimiter:
+    """
+    Thread-safe limiter enforcing a minimum interval between requests, shared by
+    every thread that calls wait().
+    """
+    def __init__(self, min_interval):
+        self.min_interval = min_interval
+        self._lock = threading.Lock()
+        self._next_at = 0.0
+
+    def wait(self):
+        """Block until the next request slot is available, then claim it."""
+        with self._lock:
+            now = time.monotonic()
+            delay = self._next_at - now
+            self._next_at = max(now, self._next_at) + self.min_interval
+        if delay > 0:
+            time.sleep(delay)
+
+
+def make_session(headers=None, pool_size=20):
+    """
+    Build a requests.Session with a pooled keep-alive adapter so repeated GETs
+    reuse TCP/TLS connections. Retries are left to get_with_backoff.
+    """
+    session = requests.Session()
+    if headers:
+        session.headers.update(headers)
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+def get_with_backoff(url, params=None, headers=None, max_attempts=MAX_ATTEMPTS, session=None,
+                     rate_limiter=None):
+    """
+    GET a URL, retrying 429 and 5xx responses with exponential backoff and jitter.
+    When a RateLimiter is given, every attempt (including retries) waits for a slot.
+    """
+    http = session or requests
+    for attempt in range(max_attempts):
+        if rate_limiter is not None:
+            rate_limiter.wait()
+        response = http.get(url, params=params, headers=headers)
+        if response.status_code not in RETRY_STATUSES or attempt == max_attempts - 1:
+            return response
+        time.sleep(backoff_delay(attempt, response.headers.get('Retry-After')))
+
+
+def cached_get(url, params=None, ttl=TTL_NORMAL, headers=None, cache=None, session=None,
+               rate_limiter=None):
+    """
+    GET a URL through the on-disk cache, retrying throttled requests with backoff.
+    Fresh entries are returned without touching the network. On a connection
+    error, a 429 or 5xx response that outlasts the retries, or a 200 whose body
+    is not JSON, the last cached entry
+    is returned if one exists. Only 200 responses with a JSON body are stored.
+    Returns:
+        CachedResponse
+    """
+    cache = cache or ResponseCache()
+    entry = cache.get(url, params)
+    if cache.is_fresh(entry):
+        return CachedResponse(entry['status'], entry['body'], from_cache=True)
+
+    try:
+        response = get_with_backoff(
+            url, params=params, headers=headers, session=session, rate_limiter=rate_limiter
+        )
+    except requests.exceptions.RequestException:
+        if entry is not None:
+            return CachedResponse(entry['status'], entry['body'], from_cache=True)
+        raise
+
+    if serves_stale(response.status_code) and entry is not None:
+        return CachedResponse(entry['status'], entry['body'], from_cache=True)
+    if response.status_code == 200:
+        try:
+            # Decode before caching so a non-JSON 200 (e.g. a maintenance page) is never stored
+            data = orjson.loads(response.text)
+        except orjson.JSONDecodeError:
+            if entry is not None:
+                return CachedResponse(entry['status'], entry['body'], from_cache=True)
+            return CachedResponse(response.status_code, response.text)
+        cache.put(url, params, response.status_code, response.text, ttl)
+        return CachedResponse(response.status_code, response.text, data=data)
+    return CachedResponse(response.status_code, response.text)
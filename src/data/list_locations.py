@@ -1,17 +1,44 @@
 import os
+import sys
+import orjson
 from dotenv import load_dotenv
-import requests
 
-load_dotenv()
-api_key = os.getenv('OPENAQ_API_KEY')
-headers = {'Accept': 'application/json', 'X-API-Key': api_key}
+from http_utils import cached_get, make_session, TTL_NORMAL
 
-response = requests.get('https://api.openaq.org/v3/locations', params={'country': 'US', 'limit': 20}, headers=headers)
+LOCATIONS_URL = 'https://api.openaq.org/v3/locations'
 
-if response.status_code != 200:
-    print(f"Error: {response.status_code} - {response.text}")
-    exit(1)
+def list_us_locations(limit=20, session=None):
+    """
+    List OpenAQ v3 locations in the US.
+    Returns a list of location dicts.
+    """
+    if session is None:
+        load_dotenv()
+        headers = {'Accept': 'application/json', 'X-API-Key': os.getenv('OPENAQ_API_KEY')}
+        session = make_session(headers)
+    response = cached_get(LOCATIONS_URL, params={'country': 'US', 'limit': limit}, ttl=TTL_NORMAL, session=session)
+    if response.status_code != 200:
+        raise RuntimeError(f"Error: {response.status_code} - {response.text}")
+    try:
+        return response.json().get('results', [])
+    except orjson.JSONDecodeError:
+        raise RuntimeError(f"Error: response is not valid JSON - {response.text[:200]}")
 
-for loc in response.json().get('results', []):
-    params = [p['parameter'] for p in loc.get('parameters', [])]
-    print(f"ID: {loc['id']} | Name: {loc['name']} | City: {loc.get('city', '')} | Parameters: {params}") 
\ No newline at end of file
+def format_locations(locations):
+    """Format locations as one line each."""
+    return "\n".join(
+        f"ID: {loc['id']} | Name: {loc['name']} | City: {loc.get('city', '')} | "
+        f"Parameters: {[p['parameter'] for p in loc.get('parameters', [])]}"
+        for loc in locations
+    )
+
+def main():
+    try:
+        locations = list_us_locations()
+    except RuntimeError as e:
+        print(str(e))
+        sys.exit(1)
+    sys.stdout.write(format_locations(locations) + "\n")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The collectors are run as scripts from src/data and import their siblings directly
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src', 'data'))
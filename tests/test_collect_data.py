@@ -0,0 +1,31 @@
+from datetime import date, datetime, timezone
+
+import collect_data
+from collect_data import date_windows, fetch_epa_data
+
+
+def test_date_windows_split_only_at_year_boundary():
+    assert date_windows(date(2026, 9, 15), date(2026, 10, 15)) == [(date(2026, 9, 15), date(2026, 10, 15))]
+    assert date_windows(date(2026, 12, 20), date(2027, 1, 10)) == [
+        (date(2026, 12, 20), date(2026, 12, 31)),
+        (date(2027, 1, 1), date(2027, 1, 10)),
+    ]
+
+
+def test_fetch_epa_data_makes_one_request_per_station_window(monkeypatch):
+    calls = []
+
+    def fake_fetch_window(station_id, bdate, edate):
+        calls.append((station_id, bdate, edate))
+        return {'Header': [{'status': 'Success'}], 'Data': [{'station_id': station_id}]}
+
+    monkeypatch.setattr(collect_data, '_fetch_window', fake_fetch_window)
+    now = datetime(2026, 10, 15, 12, tzinfo=timezone.utc)
+
+    data = fetch_epa_data(['36-005-0112', '36-081-0124'], days=30, now=now)
+
+    assert calls == [
+        ('36-005-0112', date(2026, 9, 15), date(2026, 10, 15)),
+        ('36-081-0124', date(2026, 9, 15), date(2026, 10, 15)),
+    ]
+    assert [row['station_id'] for row in data['Data']] == ['36-005-0112', '36-081-0124']
@@ -0,0 +1,275 @@
+import asyncio
+from types import SimpleNamespace
+
+import aiohttp
+import orjson
+import pandas as pd
+import pyarrow.parquet as pq
+import pytest
+
+import data_collector
+from data_collector import AirQualityDataCollector
+from http_utils import ResponseCache
+
+
+@pytest.fixture
+def collector(monkeypatch, tmp_path):
+    monkeypatch.setenv('OPENAQ_API_KEY', 'test-key-123456')
+    monkeypatch.chdir(tmp_path)
+    return AirQualityDataCollector(use_native_http=False)
+
+
+def _measurements(rows):
+    return pd.DataFrame(rows, columns=['date_utc', 'value', 'unit', 'location', 'city', 'country', 'parameter'])
+
+
+def _sorted(df):
+    return df.sort_values('date').reset_index(drop=True)
+
+
+ROWS = [
+    ('2024-01-01T00:00:00Z', 1.0, 'ug/m3', 'Site A', None, 'US', 'pm25'),
+    ('2024-01-01T00:00:00Z', 2.0, 'ug/m3', 'Site A', None, 'US', 'pm10'),
+    ('2024-01-01T01:00:00Z', 3.0, 'ug/m3', 'Site A', None, 'US', 'pm25'),
+]
+
+
+def test_process_data_keeps_null_city_rows_without_duplicates(collector):
+    result = _sorted(collector._process_data(_measurements(ROWS)))
+
+    assert len(result) == 2
+    assert result['city'].isna().all()
+    assert result['pm25'].tolist() == [1.0, 3.0]
+    assert result.loc[0, 'pm10'] == 2.0
+
+
+def test_process_data_keeps_null_city_rows_with_duplicates(collector):
+    rows = ROWS + [('2024-01-01T00:00:00Z', 5.0, 'ug/m3', 'Site A', None, 'US', 'pm25')]
+    result = _sorted(collector._process_data(_measurements(rows)))
+
+    assert len(result) == 2
+    assert result['city'].isna().all()
+    assert result['pm25'].tolist() == [3.0, 3.0]  # (1 + 5) / 2, then 3
+    assert result.loc[0, 'pm10'] == 2.0
+
+
+def test_process_data_branches_agree(collector):
+    without_duplicates = _sorted(collector._process_data(_measurements(ROWS)))
+    with_duplicates = _sorted(collector._process_data(_measurements(ROWS + [ROWS[2]])))
+
+    pd.testing.assert_frame_equal(without_duplicates, with_duplicates, check_dtype=False)
+
+
+class FakeRustyReq:
+    """Stand-in for the rusty_req module that replays canned results per page tag."""
+    class ConcurrencyMode:
+        SELECT_ALL = 'SELECT_ALL'
+
+    class RequestItem:
+        def __init__(self, **kwargs):
+            self.__dict__.update(kwargs)
+
+    def __init__(self, statuses=None, error=None, on_batch=None):
+        self.statuses = statuses or {}
+        self.error = error
+        self.on_batch = on_batch
+        self.batches = []
+
+    async def fetch_requests(self, requests, total_timeout=None, mode=None):
+        self.batches.append([item.tag for item in requests])
+        if self.on_batch is not None:
+            self.on_batch(requests)
+        if self.error is not None:
+            raise self.error
+        results = []
+        for item in requests:
+            status = self.statuses.get(item.tag, 200)
+            content = orjson.dumps({'results': [{'page': item.tag}]}).decode() if status == 200 else 'slow down'
+            results.append({
+                # rusty_req returns the response as a JSON string wrapping the body
+                'response': orjson.dumps({'content': content, 'headers': {}}).decode(),
+                'http_status': status,
+                'meta': {'tag': item.tag},
+                'exception': {} if status == 200 else {'type': 'HttpStatusError', 'message': f'HTTP status error: {status}'}
+            })
+        return results
+
+
+@pytest.fixture
+def native_collector(collector, monkeypatch, tmp_path):
+    collector.use_native_http = True
+    collector.cache = ResponseCache(str(tmp_path / 'cache'))
+    fallback_pages = []
+
+    async def fake_cached_get(url, params, ttl):
+        fallback_pages.append(params['page'])
+        return {'results': [{'page': f"aiohttp-{params['page']}"}]}
+
+    monkeypatch.setattr(collector, '_cached_get', fake_cached_get)
+    collector.fallback_pages = fallback_pages
+    return collector
+
+
+def _fetch(collector, pages):
+    return asyncio.run(collector._fetch_pages('https://example.test/measurements', {'limit': 100}, pages, 1, 'pm25'))
+
+
+def test_native_pages_are_parsed_and_failures_retried_via_aiohttp(native_collector, monkeypatch):
+    fake = FakeRustyReq(statuses={'3': 429})
+    monkeypatch.setattr(data_collector, 'rusty_req', fake)
+
+    pages = _fetch(native_collector, [2, 3, 4])
+
+    assert [page for page, _ in pages] == [2, 3, 4]
+    assert pages[0][1] == {'results': [{'page': '2'}]}
+    assert pages[1][1] == {'results': [{'page': 'aiohttp-3'}]}
+    assert native_collector.fallback_pages == [3]
+    assert native_collector.cache.is_fresh(native_collector.cache.get('https://example.test/measurements', {'limit': 100, 'page': 2}))
+
+
+def test_native_batch_error_falls_back_to_aiohttp(native_collector, monkeypatch):
+    monkeypatch.setattr(data_collector, 'rusty_req', FakeRustyReq(error=RuntimeError('boom')))
+
+    pages = _fetch(native_collector, [2, 3])
+
+    assert [data['results'][0]['page'] for _, data in pages] == ['aiohttp-2', 'aiohttp-3']
+
+
+def test_native_batches_respect_concurrency_cap(native_collector, monkeypatch):
+    native_collector.max_concurrency = 2
+    native_collector._semaphore = asyncio.Semaphore(2)
+    free_slots = []
+    fake = FakeRustyReq(on_batch=lambda requests: free_slots.append(native_collector._semaphore._value))
+    monkeypatch.setattr(data_collector, 'rusty_req', fake)
+
+    pages = _fetch(native_collector, [2, 3, 4, 5, 6])
+
+    assert fake.batches == [['2', '3'], ['4', '5'], ['6']]
+    assert free_slots == [0, 0, 1]
+    assert len(pages) == 5
+
+
+@pytest.mark.parametrize('status, serves_stale', [(429, True), (503, True), (404, False)])
+def test_cached_get_stale_fallback_on_error_status(collector, monkeypatch, tmp_path, status, serves_stale):
+    url, params = 'https://example.test/measurements', {'page': 1}
+    collector.cache = ResponseCache(str(tmp_path / 'cache'))
+    collector.cache.put(url, params, 200, '{"results": ["stale"]}', ttl=-1)
+
+    async def failing_get(url, params):
+        raise aiohttp.ClientResponseError(request_info=SimpleNamespace(real_url=url), history=(), status=status)
+
+    monkeypatch.setattr(collector, '_get_with_backoff', failing_get)
+
+    if serves_stale:
+        assert asyncio.run(collector._cached_get(url, params, 600)) == {'results': ['stale']}
+    else:
+        with pytest.raises(aiohttp.ClientResponseError):
+            asyncio.run(collector._cached_get(url, params, 600))
+
+
+def _stub_measurements(collector, monkeypatch, pages_by_parameter):
+    """Make _fetch_parameter_pages return canned (page, json) tuples per parameter."""
+    async def fake_fetch(location_id, parameter, start_date, end_date, max_pages):
+        return pages_by_parameter.get(parameter, [])
+
+    monkeypatch.setattr(collector, '_fetch_parameter_pages', fake_fetch)
+
+
+def _result(utc, value, city='Los Angeles'):
+    return {'date': {'utc': utc, 'local': utc}, 'value': value, 'unit': 'ug/m3',
+            'location': 'Site A', 'city': city, 'country': 'US', 'extra': 'dropped'}
+
+
+def test_stream_writes_long_format_parquet(collector, monkeypatch, tmp_path):
+    _stub_measurements(collector, monkeypatch, {
+        'pm25': [(1, {'results': [_result('2024-01-01T00:00:00Z', 1.5), _result('2024-01-01T01:00:00Z', 2.5)]}),
+                 (2, {'results': [_result('2024-01-01T02:00:00Z', 3.5, city=None)]})],
+        'no2': [(1, {'results': [_result('2024-01-01T00:00:00Z', 10.0)]})],
+    })
+    output_path = tmp_path / 'stream.parquet'
+
+    written = asyncio.run(collector.fetch_air_quality_data(
+        1, '2024-01-01', '2024-01-02', parameters=['pm25', 'no2'], stream=True, output_path=str(output_path)
+    ))
+
+    table = pq.read_table(output_path)
+    assert written == 4
+    assert table.schema.equals(data_collector.MEASUREMENT_SCHEMA)
+    rows = table.to_pylist()
+    assert [(row['parameter'], row['date'], row['value']) for row in rows] == [
+        ('pm25', '2024-01-01T00:00:00Z', 1.5),
+        ('pm25', '2024-01-01T01:00:00Z', 2.5),
+        ('pm25', '2024-01-01T02:00:00Z', 3.5),
+        ('no2', '2024-01-01T00:00:00Z', 10.0),
+    ]
+    assert rows[2]['city'] is None
+
+
+def test_stream_without_rows_writes_no_file(collector, monkeypatch, tmp_path):
+    _stub_measurements(collector, monkeypatch, {'pm25': [(1, {'results': []})]})
+    output_path = tmp_path / 'empty.parquet'
+
+    written = asyncio.run(collector.fetch_air_quality_data(
+        1, '2024-01-01', '2024-01-02', parameters=['pm25', 'no2'], stream=True, output_path=str(output_path)
+    ))
+
+    assert written == 0
+    assert not output_path.exists()
+
+
+def _paginate(collector, monkeypatch, found, short_page=None, max_pages=10):
+    """
+    Run _fetch_parameter_pages against a stubbed _cached_get whose pages are full
+    (PAGE_LIMIT results) up to short_page, which comes back with a single result.
+    Returns the list of page batches passed to _fetch_pages after page 1.
+    """
+    batches = []
+    fetch_pages = collector._fetch_pages
+
+    async def fake_cached_get(url, params, ttl):
+        page = params['page']
+        count = 1 if page == short_page else data_collector.PAGE_LIMIT
+        return {'meta': {'found': found}, 'results': [{'page': page}] * count}
+
+    async def spy_fetch_pages(url, params, page_numbers, location_id, parameter):
+        batches.append(list(page_numbers))
+        return await fetch_pages(url, params, page_numbers, location_id, parameter)
+
+    monkeypatch.setattr(collector, '_cached_get', fake_cached_get)
+    monkeypatch.setattr(collector, '_fetch_pages', spy_fetch_pages)
+    pages = asyncio.run(collector._fetch_parameter_pages(1, 'pm25', '2024-01-01', '2024-01-31', max_pages))
+    assert [page for page, _ in pages] == [1] + [page for batch in batches for page in batch]
+    return batches
+
+
+def test_exact_found_fetches_remaining_pages_in_one_batch(collector, monkeypatch):
+    assert _paginate(collector, monkeypatch, found=250) == [[2, 3]]
+
+
+def test_exact_found_is_capped_by_max_pages(collector, monkeypatch):
+    assert _paginate(collector, monkeypatch, found=5000, max_pages=4) == [[2, 3, 4]]
+
+
+def test_exact_found_single_page_fetches_nothing_more(collector, monkeypatch):
+    assert _paginate(collector, monkeypatch, found=50) == [[]]
+
+
+def test_lower_bound_found_fetches_speculative_batches_until_short_page(collector, monkeypatch):
+    # '>200' implies 2 pages, but batches are at least max_concurrency (8) pages wide
+    assert _paginate(collector, monkeypatch, found='>200', short_page=5) == [[2, 3, 4, 5, 6, 7, 8, 9]]
+
+
+def test_lower_bound_found_continues_while_pages_are_full(collector, monkeypatch):
+    assert _paginate(collector, monkeypatch, found='>200') == [[2, 3, 4, 5, 6, 7, 8, 9], [10]]
+
+
+def test_large_lower_bound_fetches_up_to_max_pages_at_once(collector, monkeypatch):
+    assert _paginate(collector, monkeypatch, found='>2000', max_pages=12) == [list(range(2, 13))]
+
+
+def test_missing_found_falls_back_to_concurrency_sized_batches(collector, monkeypatch):
+    assert _paginate(collector, monkeypatch, found=None, max_pages=5) == [[2, 3, 4, 5]]
+
+
+def test_missing_found_with_short_first_page_stops(collector, monkeypatch):
+    assert _paginate(collector, monkeypatch, found=None, short_page=1) == []
@@ -0,0 +1,90 @@
+import orjson
+import pytest
+
+from http_utils import MAX_ATTEMPTS, ResponseCache, cached_get
+
+URL = 'https://example.test/data'
+PARAMS = {'page': 1}
+
+
+class FakeResponse:
+    def __init__(self, status_code, text):
+        self.status_code = status_code
+        self.text = text
+        self.headers = {'Retry-After': '0'}
+
+
+class FakeSession:
+    """Returns the queued responses in order and counts calls."""
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.calls = 0
+
+    def get(self, url, params=None, headers=None):
+        self.calls += 1
+        return self.responses.pop(0)
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return ResponseCache(str(tmp_path / 'cache'))
+
+
+def _stale_entry(cache, body):
+    cache.put(URL, PARAMS, 200, body, ttl=-1)
+
+
+def test_non_json_200_is_not_cached(cache):
+    session = FakeSession(FakeResponse(200, '<html>Down for maintenance</html>'))
+
+    response = cached_get(URL, PARAMS, cache=cache, session=session)
+
+    assert response.status_code == 200
+    assert not response.from_cache
+    with pytest.raises(orjson.JSONDecodeError):
+        response.json()
+    assert cache.get(URL, PARAMS) is None
+
+
+def test_non_json_200_serves_stale_entry(cache):
+    _stale_entry(cache, '{"results": ["stale"]}')
+    session = FakeSession(FakeResponse(200, '<html>Down for maintenance</html>'))
+
+    response = cached_get(URL, PARAMS, cache=cache, session=session)
+
+    assert response.from_cache
+    assert response.json() == {'results': ['stale']}
+    # The stale entry is left in place rather than overwritten by the bad page
+    assert cache.get(URL, PARAMS)['body'] == '{"results": ["stale"]}'
+
+
+def test_json_200_is_cached_and_served_fresh(cache):
+    session = FakeSession(FakeResponse(200, '{"results": [1]}'))
+
+    first = cached_get(URL, PARAMS, cache=cache, session=session)
+    second = cached_get(URL, PARAMS, cache=cache, session=session)
+
+    assert first.json() == {'results': [1]}
+    assert second.from_cache and second.json() == {'results': [1]}
+    assert session.calls == 1
+
+
+def test_429_after_retries_serves_stale_entry(cache):
+    _stale_entry(cache, '{"results": ["stale"]}')
+    session = FakeSession(*(FakeResponse(429, 'slow down') for _ in range(MAX_ATTEMPTS)))
+
+    response = cached_get(URL, PARAMS, cache=cache, session=session)
+
+    assert session.calls == MAX_ATTEMPTS
+    assert response.from_cache
+    assert response.json() == {'results': ['stale']}
+
+
+def test_404_does_not_serve_stale_entry(cache):
+    _stale_entry(cache, '{"results": ["stale"]}')
+    session = FakeSession(FakeResponse(404, 'not found'))
+
+    response = cached_get(URL, PARAMS, cache=cache, session=session)
+
+    assert response.status_code == 404
+    assert not response.from_cache